@@ -1,31 +1,111 @@
 import os
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
-from models import Base
+import sys
+
+# Prefer the newer bundled SQLite from pysqlite3-binary when it is installed;
+# this has to happen before aiosqlite imports the stdlib module
+try:
+    import pysqlite3
+    sys.modules["sqlite3"] = pysqlite3
+    sys.modules["sqlite3.dbapi2"] = pysqlite3.dbapi2
+except ImportError:
+    pass
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from models import Base, AttentionLogModel, MAX_LOG_BATCH
+from migrate import upgrade_schema
+
+
+def _async_url(url: str) -> str:
+    # Handle PostgreSQL URL from Railway/Render (postgres:// -> postgresql://)
+    if url.startswith("postgres://"):
+        url = url.replace("postgres://", "postgresql://", 1)
+
+    # Use the async drivers unless a driver is already given in the URL
+    if url.startswith("sqlite://"):
+        url = url.replace("sqlite://", "sqlite+aiosqlite://", 1)
+    elif url.startswith("postgresql://"):
+        url = url.replace("postgresql://", "postgresql+asyncpg://", 1)
+    return url
+
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    """WAL lets dashboard reads run alongside log writes; NORMAL skips the per-commit fsync"""
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.execute("PRAGMA cache_size=-20000")
+    cursor.execute("PRAGMA mmap_size=268435456")
+    cursor.execute("PRAGMA busy_timeout=5000")
+    cursor.close()
+
+
+def _make_engine(url: str):
+    if url.startswith("sqlite"):
+        # SQLite needs check_same_thread=False for FastAPI; writes are serialized
+        # at the file level so the default pool is left as-is
+        engine_args = {"connect_args": {"check_same_thread": False}}
+    else:
+        # Pre-ping drops stale connections, LIFO checkout lets idle overflow
+        # connections time out during quiet periods
+        engine_args = {
+            "pool_size": int(os.getenv("DB_POOL_SIZE", "10")),
+            "max_overflow": int(os.getenv("DB_MAX_OVERFLOW", "20")),
+            "pool_timeout": int(os.getenv("DB_POOL_TIMEOUT", "30")),
+            "pool_recycle": int(os.getenv("DB_POOL_RECYCLE", "3600")),
+            "pool_pre_ping": True,
+            "pool_use_lifo": True,
+        }
+
+    new_engine = create_async_engine(
+        url,
+        # Room for every statement shape the API issues, plus batched
+        # multi-row INSERT ... RETURNING for bulk log ingestion
+        query_cache_size=1200,
+        insertmanyvalues_page_size=MAX_LOG_BATCH,
+        **engine_args
+    )
+    if url.startswith("sqlite"):
+        event.listen(new_engine.sync_engine, "connect", _set_sqlite_pragmas)
+    return new_engine
+
 
 # Use SQLite for local development, PostgreSQL for production
-DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./attention_monitor.db")
+DATABASE_URL = _async_url(os.getenv("DATABASE_URL", "sqlite:///./attention_monitor.db"))
+
+# Dashboard reads get their own engine so they don't queue behind log writes
+# for pool connections; point DATABASE_READ_URL at a replica if there is one
+DATABASE_READ_URL = _async_url(os.getenv("DATABASE_READ_URL", DATABASE_URL))
 
-# Handle PostgreSQL URL from Railway/Render (postgres:// -> postgresql://)
-if DATABASE_URL.startswith("postgres://"):
-    DATABASE_URL = DATABASE_URL.replace("postgres://", "postgresql://", 1)
+engine = _make_engine(DATABASE_URL)
+SessionLocal = async_sessionmaker(bind=engine, autoflush=False, expire_on_commit=False)
 
-# SQLite needs check_same_thread=False for FastAPI
-connect_args = {"check_same_thread": False} if DATABASE_URL.startswith("sqlite") else {}
+read_engine = _make_engine(DATABASE_READ_URL)
+ReadSession = async_sessionmaker(bind=read_engine, autoflush=False, expire_on_commit=False)
 
-engine = create_engine(DATABASE_URL, connect_args=connect_args)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+def _create_indexes(conn):
+    # create_all skips tables that already exist, so add any new indexes here
+    for index in AttentionLogModel.__table__.indexes:
+        index.create(conn, checkfirst=True)
 
-def init_db():
-    """Create all tables"""
-    Base.metadata.create_all(bind=engine)
 
+async def init_db():
+    """Create all tables and upgrade ones left by earlier versions"""
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+        await conn.run_sync(upgrade_schema)
+        await conn.run_sync(_create_indexes)
 
-def get_db():
+
+async def get_db():
     """Dependency for FastAPI routes"""
-    db = SessionLocal()
-    try:
+    async with SessionLocal() as db:
+        yield db
+
+
+async def get_read_db():
+    """Dependency for read-only FastAPI routes"""
+    async with ReadSession() as db:
         yield db
-    finally:
-        db.close()
@@ -1,13 +1,18 @@
+import os
 from datetime import datetime
-from fastapi import FastAPI, HTTPException, Depends
+from typing import Optional
+from fastapi import FastAPI, HTTPException, Depends, Query, Response
 from fastapi.middleware.cors import CORSMiddleware
-from sqlalchemy.orm import Session
+from fastapi.responses import PlainTextResponse
+from sqlalchemy import select, insert, update, func, case, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from database import get_db, init_db
+from database import SessionLocal, get_db, get_read_db, init_db
 from models import (
-    SessionModel, AttentionLogModel,
+    SessionModel, AttentionLogModel, utcnow, minute_bucket,
     SessionCreate, SessionUpdate, SessionResponse, SessionDetailResponse,
-    AttentionLogCreate
+    AttentionLogCreate, AttentionLogBatch, AttentionLogResponse,
+    SessionStatsResponse, StatusResponse, LogBatchResponse, AttentionSummaryBucket
 )
 
 app = FastAPI(
@@ -16,139 +21,281 @@ app = FastAPI(
     version="1.0.0"
 )
 
-# CORS middleware for frontend
+# CORS middleware for frontend. CORS_ORIGINS is a comma-separated list of
+# allowed origins; credentials are only allowed with an explicit list, since
+# a "*" origin can't be combined with them
+CORS_ORIGINS = [origin.strip() for origin in os.getenv("CORS_ORIGINS", "*").split(",") if origin.strip()]
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=["*"],
-    allow_credentials=True,
+    allow_origins=CORS_ORIGINS,
+    allow_credentials="*" not in CORS_ORIGINS,
     allow_methods=["*"],
     allow_headers=["*"],
+    max_age=86400,
 )
 
 
 @app.on_event("startup")
-def startup():
+async def startup():
     """Initialize database on startup"""
-    init_db()
+    await init_db()
+    async with SessionLocal() as db:
+        active = await db.scalars(select(SessionModel.id).where(SessionModel.is_active.is_(True)))
+        _ACTIVE_SESSIONS.update(active)
 
 
-@app.get("/")
-def root():
+@app.get("/", response_class=PlainTextResponse)
+async def root():
     """Health check endpoint"""
-    return {"status": "ok", "message": "Attention Monitor API"}
+    return PlainTextResponse("ok")
 
 
-@app.get("/api/health")
-def health_check():
+@app.get("/api/health", response_class=PlainTextResponse)
+async def health_check():
     """Health check endpoint"""
-    return {"status": "healthy"}
+    return PlainTextResponse("ok")
+
+
+# Built once so every log insert hits the same compiled statement
+_LOG_INSERT = insert(AttentionLogModel)
+
+# Clients post one attention sample per second
+SAMPLE_SECONDS = 1.0
+
+# Ids of sessions known to be active in this process, so log writes can
+# skip the lookup; misses fall back to the database (e.g. other workers)
+_ACTIVE_SESSIONS: set[int] = set()
+
+
+def _log_page(session_id: int, limit: int, before: Optional[datetime], before_id: Optional[int]):
+    """Newest-first page of log columns, keyed on (timestamp, id)"""
+    query = select(
+        AttentionLogModel.id,
+        AttentionLogModel.timestamp,
+        AttentionLogModel.is_attentive.label("is_attentive"),
+        AttentionLogModel.face_detected.label("face_detected"),
+        AttentionLogModel.face_looking.label("face_looking"),
+        AttentionLogModel.eyes_looking.label("eyes_looking")
+    ).where(AttentionLogModel.session_id == session_id)
+    # Rows from one batch share a server timestamp, so the cursor needs the id
+    # too or a page ending inside a batch would skip the rest of it
+    if before is not None and before_id is not None:
+        query = query.where(
+            tuple_(AttentionLogModel.timestamp, AttentionLogModel.id) < (before, before_id)
+        )
+    elif before is not None:
+        query = query.where(AttentionLogModel.timestamp < before)
+    return query.order_by(
+        AttentionLogModel.timestamp.desc(), AttentionLogModel.id.desc()
+    ).limit(limit)
+
+
+async def _ensure_session(db: AsyncSession, session_id: int):
+    exists = await db.scalar(select(SessionModel.id).where(SessionModel.id == session_id))
+    if exists is None:
+        raise HTTPException(status_code=404, detail="Session not found")
+
+
+async def _ensure_active(db: AsyncSession, session_id: int):
+    if session_id in _ACTIVE_SESSIONS:
+        return
+    active = await db.scalar(
+        select(SessionModel.id)
+        .where(SessionModel.id == session_id, SessionModel.is_active.is_(True))
+    )
+    if active is None:
+        raise HTTPException(status_code=404, detail="Session not found")
+    _ACTIVE_SESSIONS.add(session_id)
+
+
+async def _record_logs(db: AsyncSession, session_id: int, logs: list[AttentionLogCreate]):
+    """Insert log rows and fold them into the session's counters in one transaction"""
+    await _ensure_active(db, session_id)
+    total_time = SessionModel.total_time + len(logs) * SAMPLE_SECONDS
+    attention_time = SessionModel.attention_time + \
+        sum(SAMPLE_SECONDS for log in logs if log.is_attentive)
+    result = await db.execute(
+        update(SessionModel)
+        .where(SessionModel.id == session_id, SessionModel.is_active.is_(True))
+        .values(
+            total_time=total_time,
+            attention_time=attention_time,
+            attention_pct=attention_time * 100.0 / total_time
+        )
+    )
+    if result.rowcount == 0:
+        # Ended or deleted since it was cached, possibly by another worker
+        _ACTIVE_SESSIONS.discard(session_id)
+        raise HTTPException(status_code=404, detail="Session not found")
+
+    await db.execute(_LOG_INSERT, [log.to_row(session_id) for log in logs])
+    await db.commit()
 
 
 # Session endpoints
 @app.post("/api/sessions", response_model=SessionResponse)
-def create_session(db: Session = Depends(get_db)):
+async def create_session(db: AsyncSession = Depends(get_db)):
     """Start a new attention monitoring session"""
-    session = SessionModel(
-        start_time=datetime.utcnow(),
-        is_active=True
+    session = await db.scalar(
+        insert(SessionModel).values(is_active=True).returning(SessionModel)
     )
-    db.add(session)
-    db.commit()
-    db.refresh(session)
+    await db.commit()
+    _ACTIVE_SESSIONS.add(session.id)
     return session
 
 
 @app.get("/api/sessions", response_model=list[SessionResponse])
-def list_sessions(limit: int = 10, db: Session = Depends(get_db)):
+async def list_sessions(limit: int = 10, db: AsyncSession = Depends(get_read_db)):
     """List recent sessions"""
-    sessions = db.query(SessionModel)\
-        .order_by(SessionModel.start_time.desc())\
-        .limit(limit)\
-        .all()
-    return sessions
+    sessions = await db.scalars(
+        select(SessionModel)
+        .order_by(SessionModel.start_time.desc())
+        .limit(limit)
+    )
+    return sessions.all()
 
 
-@app.get("/api/sessions/{session_id}", response_model=SessionDetailResponse)
-def get_session(session_id: int, db: Session = Depends(get_db)):
-    """Get session details with logs"""
-    session = db.query(SessionModel).filter(SessionModel.id == session_id).first()
+@app.get(
+    "/api/sessions/{session_id}",
+    response_model=SessionDetailResponse,
+    response_model_exclude_unset=True
+)
+async def get_session(
+    session_id: int,
+    include_logs: bool = False,
+    log_limit: int = Query(500, ge=1, le=5000),
+    before: Optional[datetime] = None,
+    before_id: Optional[int] = None,
+    db: AsyncSession = Depends(get_read_db)
+):
+    """Get session details, optionally with a page of recent logs"""
+    session = await db.scalar(select(SessionModel).where(SessionModel.id == session_id))
     if not session:
         raise HTTPException(status_code=404, detail="Session not found")
-    return session
+
+    response = SessionResponse.model_validate(session).model_dump()
+    if include_logs:
+        logs = await db.execute(_log_page(session_id, log_limit, before, before_id))
+        response["logs"] = logs.mappings().all()
+    return response
 
 
-@app.put("/api/sessions/{session_id}", response_model=SessionResponse)
-def update_session(
+@app.get("/api/sessions/{session_id}/logs", response_model=list[AttentionLogResponse])
+async def list_session_logs(
     session_id: int,
-    update: SessionUpdate,
-    db: Session = Depends(get_db)
+    limit: int = Query(500, ge=1, le=5000),
+    before: Optional[datetime] = None,
+    before_id: Optional[int] = None,
+    db: AsyncSession = Depends(get_read_db)
 ):
-    """Update session stats"""
-    session = db.query(SessionModel).filter(SessionModel.id == session_id).first()
-    if not session:
-        raise HTTPException(status_code=404, detail="Session not found")
+    """Page through a session's logs, newest first; pass the last row's timestamp and id as `before`/`before_id`"""
+    await _ensure_session(db, session_id)
+    logs = await db.execute(_log_page(session_id, limit, before, before_id))
+    return logs.mappings().all()
 
-    if update.total_time is not None:
-        session.total_time = update.total_time
-    if update.attention_time is not None:
-        session.attention_time = update.attention_time
-    if update.attention_pct is not None:
-        session.attention_pct = update.attention_pct
-
-    # Optionally log attention state
-    if update.is_attentive is not None:
-        log = AttentionLogModel(
-            session_id=session_id,
-            is_attentive=update.is_attentive
-        )
-        db.add(log)
 
-    db.commit()
-    db.refresh(session)
-    return session
+@app.get("/api/sessions/{session_id}/stats", response_model=SessionStatsResponse)
+async def get_session_stats(session_id: int, db: AsyncSession = Depends(get_read_db)):
+    """Attention counts computed in the database from the session's logs"""
+    await _ensure_session(db, session_id)
+    row = (await db.execute(
+        select(
+            func.count(AttentionLogModel.id).label("log_count"),
+            func.count(AttentionLogModel.id)
+                .filter(AttentionLogModel.is_attentive)
+                .label("attentive_count")
+        ).where(AttentionLogModel.session_id == session_id)
+    )).one()
+    attention_pct = row.attentive_count * 100.0 / row.log_count if row.log_count else 100.0
+    return {
+        "session_id": session_id,
+        "log_count": row.log_count,
+        "attentive_count": row.attentive_count,
+        "attention_pct": attention_pct
+    }
+
+
+@app.get("/api/sessions/{session_id}/summary", response_model=list[AttentionSummaryBucket])
+async def get_session_summary(
+    session_id: int,
+    since: Optional[datetime] = None,
+    db: AsyncSession = Depends(get_read_db)
+):
+    """Per-minute attention aggregates, so dashboards never need the raw logs"""
+    await _ensure_session(db, session_id)
+    minute = minute_bucket(AttentionLogModel.timestamp)
+    query = select(
+        minute.label("minute"),
+        func.count().label("log_count"),
+        func.sum(case((AttentionLogModel.is_attentive, 1), else_=0)).label("attentive_count"),
+        func.min(AttentionLogModel.timestamp).label("first_log"),
+        func.max(AttentionLogModel.timestamp).label("last_log")
+    ).where(AttentionLogModel.session_id == session_id)
+    if since is not None:
+        query = query.where(AttentionLogModel.timestamp >= since)
+
+    rows = await db.execute(query.group_by(minute).order_by(minute))
+    return [
+        {**row, "attention_pct": row["attentive_count"] * 100.0 / row["log_count"]}
+        for row in rows.mappings()
+    ]
+
+
+@app.put("/api/sessions/{session_id}", response_model=StatusResponse)
+async def update_session(
+    session_id: int,
+    data: SessionUpdate,
+    db: AsyncSession = Depends(get_db)
+):
+    """Log the current attention state and update session stats"""
+    if data.is_attentive is None:
+        return Response(status_code=204)
+
+    await _record_logs(db, session_id, [AttentionLogCreate(is_attentive=data.is_attentive)])
+    return {"status": "ok"}
 
 
 @app.post("/api/sessions/{session_id}/end", response_model=SessionResponse)
-def end_session(session_id: int, db: Session = Depends(get_db)):
+async def end_session(session_id: int, db: AsyncSession = Depends(get_db)):
     """End an active session"""
-    session = db.query(SessionModel).filter(SessionModel.id == session_id).first()
+    session = await db.scalar(
+        update(SessionModel)
+        .where(SessionModel.id == session_id)
+        .values(end_time=utcnow(), is_active=False)
+        .returning(SessionModel)
+    )
     if not session:
         raise HTTPException(status_code=404, detail="Session not found")
-
-    session.end_time = datetime.utcnow()
-    session.is_active = False
-    db.commit()
-    db.refresh(session)
+    await db.commit()
+    _ACTIVE_SESSIONS.discard(session_id)
     return session
 
 
-@app.post("/api/sessions/{session_id}/logs")
-def add_attention_log(
+@app.post("/api/sessions/{session_id}/logs", response_model=StatusResponse)
+async def add_attention_log(
     session_id: int,
     log_data: AttentionLogCreate,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Add a detailed attention log entry"""
-    session = db.query(SessionModel).filter(SessionModel.id == session_id).first()
-    if not session:
-        raise HTTPException(status_code=404, detail="Session not found")
-
-    log = AttentionLogModel(
-        session_id=session_id,
-        is_attentive=log_data.is_attentive,
-        face_detected=log_data.face_detected,
-        face_looking=log_data.face_looking,
-        eyes_looking=log_data.eyes_looking,
-        nose_offset_x=log_data.nose_offset_x,
-        nose_offset_y=log_data.nose_offset_y,
-        eye_gaze_x=log_data.eye_gaze_x,
-        eye_gaze_y=log_data.eye_gaze_y
-    )
-    db.add(log)
-    db.commit()
+    await _record_logs(db, session_id, [log_data])
     return {"status": "ok"}
 
 
+@app.post("/api/sessions/{session_id}/logs/batch", response_model=LogBatchResponse)
+async def add_attention_logs(
+    session_id: int,
+    batch: AttentionLogBatch,
+    db: AsyncSession = Depends(get_db)
+):
+    """Add several attention log entries in one transaction"""
+    if batch.logs:
+        await _record_logs(db, session_id, batch.logs)
+    else:
+        await _ensure_active(db, session_id)
+    return {"status": "ok", "count": len(batch.logs)}
+
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
@@ -0,0 +1,108 @@
+"""
+Schema upgrades for databases created by earlier versions.
+
+init_db runs these on every startup; each step checks whether it is needed.
+Run  python migrate.py  to upgrade a database without starting the API.
+"""
+
+import asyncio
+from sqlalchemy import inspect
+
+from models import Base, FACE_DETECTED, FACE_LOOKING, EYES_LOOKING, IS_ATTENTIVE
+
+
+def _column_names(conn, table):
+    return {c["name"] for c in inspect(conn).get_columns(table)}
+
+
+def _column_default(conn, table, column):
+    columns = {c["name"]: c for c in inspect(conn).get_columns(table)}
+    return columns[column]["default"]
+
+
+def _rebuild_sqlite_tables(conn):
+    """SQLite can't alter columns in place, so copy rows into fresh tables"""
+    tables = [table.name for table in Base.metadata.sorted_tables]
+    old_columns = {}
+    for name in tables:
+        old_columns[name] = [c["name"] for c in inspect(conn).get_columns(name)]
+        for index in inspect(conn).get_indexes(name):
+            conn.exec_driver_sql(f'DROP INDEX "{index["name"]}"')
+        conn.exec_driver_sql(f'ALTER TABLE "{name}" RENAME TO "{name}_old"')
+
+    Base.metadata.create_all(conn)
+
+    for table in Base.metadata.sorted_tables:
+        columns = ", ".join(
+            f'"{c.name}"' for c in table.columns if c.name in old_columns[table.name]
+        )
+        conn.exec_driver_sql(
+            f'INSERT INTO "{table.name}" ({columns}) SELECT {columns} FROM "{table.name}_old"'
+        )
+    for name in reversed(tables):
+        conn.exec_driver_sql(f'DROP TABLE "{name}_old"')
+
+
+def upgrade_timestamps(conn):
+    """Timezone-aware timestamp columns filled in by the database"""
+    if _column_default(conn, "attention_logs", "timestamp") is not None:
+        return
+
+    if conn.dialect.name == "postgresql":
+        for table, column in (("sessions", "start_time"), ("attention_logs", "timestamp")):
+            conn.exec_driver_sql(
+                f'ALTER TABLE {table} '
+                f'ALTER COLUMN "{column}" TYPE TIMESTAMP WITH TIME ZONE '
+                f'USING "{column}" AT TIME ZONE \'UTC\', '
+                f'ALTER COLUMN "{column}" SET DEFAULT CURRENT_TIMESTAMP, '
+                f'ALTER COLUMN "{column}" SET NOT NULL'
+            )
+        conn.exec_driver_sql(
+            "ALTER TABLE sessions ALTER COLUMN end_time TYPE TIMESTAMP WITH TIME ZONE "
+            "USING end_time AT TIME ZONE 'UTC'"
+        )
+    else:
+        _rebuild_sqlite_tables(conn)
+
+
+def pack_log_flags(conn):
+    """Fold the four boolean log columns into the flags bitmask"""
+    if "flags" in _column_names(conn, "attention_logs"):
+        return
+
+    conn.exec_driver_sql(
+        "ALTER TABLE attention_logs ADD COLUMN flags SMALLINT NOT NULL DEFAULT 0"
+    )
+    conn.exec_driver_sql(
+        "UPDATE attention_logs SET flags = "
+        + " + ".join(
+            f"CASE WHEN {column} THEN {bit} ELSE 0 END"
+            for column, bit in (
+                ("face_detected", FACE_DETECTED),
+                ("face_looking", FACE_LOOKING),
+                ("eyes_looking", EYES_LOOKING),
+                ("is_attentive", IS_ATTENTIVE),
+            )
+        )
+    )
+    for column in ("face_detected", "face_looking", "eyes_looking", "is_attentive"):
+        conn.exec_driver_sql(f"ALTER TABLE attention_logs DROP COLUMN {column}")
+
+
+def upgrade_schema(conn):
+    """Bring tables created by earlier versions up to date"""
+    # Flags first: the SQLite timestamp rebuild only copies current columns
+    pack_log_flags(conn)
+    upgrade_timestamps(conn)
+
+
+async def migrate():
+    # Imported here since database imports this module for init_db
+    from database import engine, init_db
+    await init_db()
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(migrate())
+    print("Database schema is up to date")
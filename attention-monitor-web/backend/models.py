@@ -1,43 +1,114 @@
 from datetime import datetime
 from typing import Optional
-from pydantic import BaseModel
-from sqlalchemy import Column, Integer, Float, String, DateTime, Boolean, ForeignKey, create_engine
+from pydantic import BaseModel, ConfigDict, Field
+from sqlalchemy import Column, Integer, SmallInteger, Float, String, DateTime, Boolean, ForeignKey, Index, create_engine
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.ext.hybrid import hybrid_property
 from sqlalchemy.orm import declarative_base, relationship, sessionmaker
+from sqlalchemy.sql.expression import FunctionElement
 
 Base = declarative_base()
 
 
+class utcnow(FunctionElement):
+    """Database-side current time, usable as a server default"""
+    type = DateTime(timezone=True)
+    inherit_cache = True
+
+
+@compiles(utcnow)
+def _utcnow_default(element, compiler, **kw):
+    return "CURRENT_TIMESTAMP"
+
+
+@compiles(utcnow, "sqlite")
+def _utcnow_sqlite(element, compiler, **kw):
+    # Match the text format SQLAlchemy stores datetimes in on SQLite, so
+    # server-set and bound values compare correctly (CURRENT_TIMESTAMP
+    # has no fractional seconds)
+    return "(STRFTIME('%Y-%m-%d %H:%M:%f000', 'now'))"
+
+
+class minute_bucket(FunctionElement):
+    """Truncate a timestamp column to the start of its minute"""
+    type = DateTime(timezone=True)
+    inherit_cache = True
+
+
+@compiles(minute_bucket)
+def _minute_bucket_default(element, compiler, **kw):
+    return "date_trunc('minute', %s)" % compiler.process(element.clauses, **kw)
+
+
+@compiles(minute_bucket, "sqlite")
+def _minute_bucket_sqlite(element, compiler, **kw):
+    return "STRFTIME('%%Y-%%m-%%d %%H:%%M:00', %s)" % compiler.process(element.clauses, **kw)
+
+
+# Bits of AttentionLogModel.flags
+FACE_DETECTED = 1
+FACE_LOOKING = 2
+EYES_LOOKING = 4
+IS_ATTENTIVE = 8
+
+
+def pack_flags(face_detected: bool, face_looking: bool, eyes_looking: bool, is_attentive: bool) -> int:
+    return (
+        face_detected * FACE_DETECTED
+        | face_looking * FACE_LOOKING
+        | eyes_looking * EYES_LOOKING
+        | is_attentive * IS_ATTENTIVE
+    )
+
+
+def _flag(bit: int):
+    """Boolean view of one flags bit, usable on instances and in queries"""
+    return hybrid_property(
+        lambda self: bool(self.flags & bit),
+        expr=lambda cls: cls.flags.op("&")(bit) != 0
+    )
+
+
 # SQLAlchemy Models
 class SessionModel(Base):
     __tablename__ = "sessions"
 
-    id = Column(Integer, primary_key=True, index=True)
-    start_time = Column(DateTime, default=datetime.utcnow)
-    end_time = Column(DateTime, nullable=True)
+    id = Column(Integer, primary_key=True)
+    start_time = Column(DateTime(timezone=True), server_default=utcnow(), nullable=False)
+    end_time = Column(DateTime(timezone=True), nullable=True)
     total_time = Column(Float, default=0.0)
     attention_time = Column(Float, default=0.0)
     attention_pct = Column(Float, default=100.0)
     is_active = Column(Boolean, default=True)
 
-    logs = relationship("AttentionLogModel", back_populates="session")
+    logs = relationship("AttentionLogModel", back_populates="session", lazy="raise")
+
+    # Fetch generated defaults via RETURNING instead of a follow-up SELECT
+    __mapper_args__ = {"eager_defaults": True}
 
 
 class AttentionLogModel(Base):
     __tablename__ = "attention_logs"
 
-    id = Column(Integer, primary_key=True, index=True)
+    id = Column(Integer, primary_key=True)
     session_id = Column(Integer, ForeignKey("sessions.id"))
-    timestamp = Column(DateTime, default=datetime.utcnow)
-    is_attentive = Column(Boolean)
-    face_detected = Column(Boolean, default=False)
-    face_looking = Column(Boolean, default=False)
-    eyes_looking = Column(Boolean, default=False)
+    timestamp = Column(DateTime(timezone=True), server_default=utcnow(), nullable=False)
+    flags = Column(SmallInteger, default=0, nullable=False)
     nose_offset_x = Column(Float, default=0.0)
     nose_offset_y = Column(Float, default=0.0)
     eye_gaze_x = Column(Float, default=0.0)
     eye_gaze_y = Column(Float, default=0.0)
 
-    session = relationship("SessionModel", back_populates="logs")
+    session = relationship("SessionModel", back_populates="logs", lazy="raise")
+
+    face_detected = _flag(FACE_DETECTED)
+    face_looking = _flag(FACE_LOOKING)
+    eyes_looking = _flag(EYES_LOOKING)
+    is_attentive = _flag(IS_ATTENTIVE)
+
+    # Covers per-session lookups and time-ordered ranges within a session
+    __table_args__ = (Index("ix_logs_session_ts", "session_id", "timestamp"),)
+    __mapper_args__ = {"eager_defaults": True}
 
 
 # Pydantic Models for API
@@ -46,9 +117,6 @@ class SessionCreate(BaseModel):
 
 
 class SessionUpdate(BaseModel):
-    total_time: Optional[float] = None
-    attention_time: Optional[float] = None
-    attention_pct: Optional[float] = None
     is_attentive: Optional[bool] = None
 
 
@@ -62,6 +130,27 @@ class AttentionLogCreate(BaseModel):
     eye_gaze_x: float = 0.0
     eye_gaze_y: float = 0.0
 
+    def to_row(self, session_id: int) -> dict:
+        """Column values for AttentionLogModel, with the booleans packed into flags"""
+        return {
+            "session_id": session_id,
+            "flags": pack_flags(
+                self.face_detected, self.face_looking, self.eyes_looking, self.is_attentive
+            ),
+            "nose_offset_x": self.nose_offset_x,
+            "nose_offset_y": self.nose_offset_y,
+            "eye_gaze_x": self.eye_gaze_x,
+            "eye_gaze_y": self.eye_gaze_y,
+        }
+
+
+# Largest batch accepted per request; also the engine's multi-row INSERT page size
+MAX_LOG_BATCH = 1000
+
+
+class AttentionLogBatch(BaseModel):
+    logs: list[AttentionLogCreate] = Field(max_length=MAX_LOG_BATCH)
+
 
 class AttentionLogResponse(BaseModel):
     id: int
@@ -71,8 +160,7 @@ class AttentionLogResponse(BaseModel):
     face_looking: bool
     eyes_looking: bool
 
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True, frozen=True)
 
 
 class SessionResponse(BaseModel):
@@ -84,9 +172,38 @@ class SessionResponse(BaseModel):
     attention_pct: float
     is_active: bool
 
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True, frozen=True)
 
 
 class SessionDetailResponse(SessionResponse):
     logs: list[AttentionLogResponse] = []
+
+
+class SessionStatsResponse(BaseModel):
+    session_id: int
+    log_count: int
+    attentive_count: int
+    attention_pct: float
+
+    model_config = ConfigDict(frozen=True)
+
+
+class StatusResponse(BaseModel):
+    status: str
+
+    model_config = ConfigDict(frozen=True)
+
+
+class LogBatchResponse(StatusResponse):
+    count: int
+
+
+class AttentionSummaryBucket(BaseModel):
+    minute: datetime
+    log_count: int
+    attentive_count: int
+    attention_pct: float
+    first_log: datetime
+    last_log: datetime
+
+    model_config = ConfigDict(frozen=True)
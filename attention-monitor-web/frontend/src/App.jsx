@@ -1,4 +1,4 @@
-import React, { useState, useEffect } from 'react'
+import React, { useState, useEffect, useRef } from 'react'
 import AttentionMonitor from './components/AttentionMonitor'
 import StatsOverlay from './components/StatsOverlay'
 import ThresholdControls from './components/ThresholdControls'
@@ -23,6 +23,9 @@ function App() {
     avgEyeGazeX: 0,
     avgEyeGazeY: 0
   })
+  // Latest stats for the update interval, so it isn't restarted on every frame
+  const statsRef = useRef(stats)
+  statsRef.current = stats
   const [thresholds, setThresholds] = useState({
     face: 0.31,
     eye: 0.22
@@ -48,10 +51,7 @@ function App() {
     const interval = setInterval(async () => {
       try {
         await updateSession(sessionId, {
-          total_time: stats.sessionTime,
-          attention_time: stats.attentionTime,
-          attention_pct: stats.attentionPercentage,
-          is_attentive: stats.isAttentive
+          is_attentive: statsRef.current.isAttentive
         })
       } catch (err) {
         // Ignore errors if backend is unavailable
@@ -59,7 +59,7 @@ function App() {
     }, 1000)
 
     return () => clearInterval(interval)
-  }, [sessionId, stats, isPaused])
+  }, [sessionId, isPaused])
 
   const handleReset = () => {
     setStats(prev => ({
@@ -4,13 +4,33 @@ Uses webcam to monitor user attention through face detection and head pose.
 Tracks attention time and provides visual alerts when distracted.
 """
 
+import os
+
+# Capture and the UI each take a core; give the rest to inference. The BLAS/OpenMP
+# pools size themselves on import, so this has to come before cv2 and numpy.
+WORKER_THREADS = max(1, (os.cpu_count() or 1) - 2)
+os.environ.setdefault("OMP_NUM_THREADS", str(WORKER_THREADS))
+os.environ.setdefault("MKL_NUM_THREADS", str(WORKER_THREADS))
+
 import cv2
 import mediapipe as mp
 import numpy as np
+import atexit
+import copy
 import csv
+import queue
+import threading
 import time
-from datetime import datetime
+from datetime import datetime, timedelta
 from pathlib import Path
+from typing import Optional
+
+try:
+    from numba import njit
+except ImportError:
+    # numba is optional; without it the attention math runs as plain Python
+    def njit(*args, **kwargs):
+        return lambda func: func
 
 
 # Configuration thresholds
@@ -20,28 +40,41 @@ class Config:
 
     # Eye/Gaze detection: iris position within eye
     EYE_GAZE_THRESHOLD = 0.22        # How far iris can be from eye center (0-0.5 scale)
+    IRIS_REFINE = True               # False skips MediaPipe's iris model (faster, coarser gaze)
 
     DISTRACTION_ALERT_DELAY = 5.0    # seconds before showing alert
     HYSTERESIS_DELAY = 0.3           # seconds to prevent state flickering
     LOG_INTERVAL = 1.0               # seconds between CSV log entries
+    LOG_FLUSH_ROWS = 30              # CSV rows buffered before writing to disk
+    TARGET_FPS = 30                  # most face mesh runs per second
+    DISPLAY_FPS = 30                 # most window redraws per second
+    INFERENCE_WIDTH = 320            # frame width fed to MediaPipe (display stays full size)
+    MOTION_THRESHOLD = 2.0           # mean 32x32 gray change below which a frame counts as static
+    MOTION_MAX_SKIP = 15             # most static frames in a row that reuse the last detection
+    USE_OPENCL = False               # resize/convert inference frames on the GPU when available
     DEBUG_MODE = True                # Show debug values on screen
 
 
 class AttentionTimer:
-    """Tracks attention and session timing statistics."""
+    """Tracks attention and session timing statistics.
 
-    def __init__(self):
-        self.session_start = time.time()
+    Times come from time.perf_counter(); callers pass one `now` per frame.
+    """
+
+    def __init__(self, now: Optional[float] = None):
+        now = time.perf_counter() if now is None else now
+        self.session_start = now
+        self.session_start_wall = time.time()
         self.total_attention_time = 0.0
-        self.last_update_time = time.time()
+        self.last_update_time = now
         self.is_currently_attentive = False
         self.attention_start_time = None
         self.distraction_start_time = None
         self.current_distraction_duration = 0.0
 
-    def update(self, is_attentive: bool):
+    def update(self, is_attentive: bool, now: Optional[float] = None):
         """Update timers based on current attention state."""
-        current_time = time.time()
+        current_time = time.perf_counter() if now is None else now
         elapsed = current_time - self.last_update_time
 
         if is_attentive:
@@ -58,11 +91,11 @@ class AttentionTimer:
         self.is_currently_attentive = is_attentive
         self.last_update_time = current_time
 
-    def get_session_time(self) -> float:
-        return time.time() - self.session_start
+    def get_session_time(self, now: Optional[float] = None) -> float:
+        return (time.perf_counter() if now is None else now) - self.session_start
 
-    def get_attention_percentage(self) -> float:
-        session_time = self.get_session_time()
+    def get_attention_percentage(self, now: Optional[float] = None) -> float:
+        session_time = self.get_session_time(now)
         if session_time == 0:
             return 100.0
         return (self.total_attention_time / session_time) * 100
@@ -73,8 +106,37 @@ class AttentionTimer:
         secs = int(seconds % 60)
         return f"{hours:02d}:{minutes:02d}:{secs:02d}"
 
-    def reset(self):
-        self.__init__()
+    def reset(self, now: Optional[float] = None):
+        self.__init__(now)
+
+
+@njit(cache=True)
+def _region_offset(pts, row):
+    """Offset of landmark `row` from the center of the bounds in the next four rows."""
+    center_x = (pts[row + 1, 0] + pts[row + 2, 0]) / 2
+    center_y = (pts[row + 3, 1] + pts[row + 4, 1]) / 2
+    width = abs(pts[row + 2, 0] - pts[row + 1, 0])
+    height = abs(pts[row + 4, 1] - pts[row + 3, 1])
+    if width > 0 and height > 0:
+        return (pts[row, 0] - center_x) / width, (pts[row, 1] - center_y) / height, width
+    return 0.0, 0.0, width
+
+
+@njit(cache=True)
+def _compute_state(pts, nose_thr, eye_thr):
+    """Nose and iris offsets from the LM_IDX landmark rows, and whether each is on screen."""
+    nose_x, nose_y, face_width = _region_offset(pts, 0)
+    left_x, left_y, _ = _region_offset(pts, 5)
+    right_x, right_y, _ = _region_offset(pts, 10)
+
+    face_ok = abs(nose_x) < nose_thr and abs(nose_y) < nose_thr
+
+    # Average gaze from both eyes; looking at screen if iris is near center of eye
+    avg_x = (abs(left_x) + abs(right_x)) / 2
+    avg_y = (abs(left_y) + abs(right_y)) / 2
+    eyes_ok = avg_x < eye_thr and avg_y < eye_thr
+
+    return nose_x, nose_y, face_width, face_ok, left_x, left_y, right_x, right_y, avg_x, avg_y, eyes_ok
 
 
 class AttentionDetector:
@@ -102,12 +164,20 @@ class AttentionDetector:
     RIGHT_EYE_TOP = 386    # Right eye, top
     RIGHT_EYE_BOTTOM = 374 # Right eye, bottom
 
+    # Landmarks gathered each frame: for the face and each eye, the tracked
+    # point followed by its left, right, top and bottom bounds
+    LM_IDX = np.array([
+        NOSE_TIP, LEFT_CHEEK, RIGHT_CHEEK, FOREHEAD, CHIN,
+        LEFT_IRIS_CENTER, LEFT_EYE_LEFT, LEFT_EYE_RIGHT, LEFT_EYE_TOP, LEFT_EYE_BOTTOM,
+        RIGHT_IRIS_CENTER, RIGHT_EYE_LEFT, RIGHT_EYE_RIGHT, RIGHT_EYE_TOP, RIGHT_EYE_BOTTOM,
+    ])
+
     def __init__(self):
         self.mp_face_mesh = mp.solutions.face_mesh
         self.mp_drawing = mp.solutions.drawing_utils
         self.face_mesh = self.mp_face_mesh.FaceMesh(
             max_num_faces=1,
-            refine_landmarks=True,
+            refine_landmarks=Config.IRIS_REFINE,
             min_detection_confidence=0.5,
             min_tracking_confidence=0.5
         )
@@ -115,132 +185,145 @@ class AttentionDetector:
         # State
         self.face_detected = False
         self.is_attentive = False
-        self.last_state_change = time.time()
+        self.last_state_change = time.perf_counter()
         self.pending_state = None
 
-        # Face tracking
-        self.nose_offset_x = 0.0
-        self.nose_offset_y = 0.0
+        # Last landmarks (LM_IDX rows), drawn on frames that skip inference
+        self._lm_buf = np.empty((len(self.LM_IDX), 2))
+        self._lm_idx = self.LM_IDX.copy()
+        if not Config.IRIS_REFINE:
+            # Iris landmarks don't exist without refinement; those rows are
+            # estimated from the eye bounds after reading
+            self._lm_idx[[5, 10]] = [self.LEFT_EYE_LEFT, self.RIGHT_EYE_LEFT]
+        self.landmarks = None
+
+        # Reused resize and RGB conversion outputs, allocated on the first frame
+        self._small_buf = None
+        self._rgb_buf = None
+
+        # Thumbnail of the last frame face mesh ran on, for the motion gate
+        self._prev_thumb = None
+        self._skipped_frames = 0
+
+        self._use_opencl = Config.USE_OPENCL and cv2.ocl.haveOpenCL()
+        if self._use_opencl:
+            cv2.ocl.setUseOpenCL(True)
+
+        # Face tracking: nose offset [x, y]
+        self.nose_offset = np.zeros(2, np.float32)
         self.face_width = 0.0
         self.face_looking_at_screen = False
 
-        # Eye tracking
-        self.left_eye_gaze_x = 0.0
-        self.left_eye_gaze_y = 0.0
-        self.right_eye_gaze_x = 0.0
-        self.right_eye_gaze_y = 0.0
+        # Eye tracking: per-eye gaze [left x, left y, right x, right y] and the
+        # mean magnitude of both eyes [x, y], which the logger and overlay show
+        self.eye_gaze = np.zeros(4, np.float32)
+        self.avg_gaze = np.zeros(2, np.float32)
         self.eyes_looking_at_screen = False
 
-    def process_frame(self, frame):
+    def process_frame(self, frame, now: Optional[float] = None):
         """Process frame and determine attention state."""
-        img_h, img_w = frame.shape[:2]
-
-        # Convert to RGB
-        rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        results = self.face_mesh.process(rgb_frame)
-
-        self.face_detected = False
-        self.face_looking_at_screen = False
-        self.eyes_looking_at_screen = False
-
-        if results.multi_face_landmarks:
-            self.face_detected = True
-            landmarks = results.multi_face_landmarks[0].landmark
-
-            # === FACE TRACKING ===
-            nose = landmarks[self.NOSE_TIP]
-            left_cheek = landmarks[self.LEFT_CHEEK]
-            right_cheek = landmarks[self.RIGHT_CHEEK]
-            forehead = landmarks[self.FOREHEAD]
-            chin = landmarks[self.CHIN]
-
-            face_center_x = (left_cheek.x + right_cheek.x) / 2
-            face_center_y = (forehead.y + chin.y) / 2
-
-            self.face_width = abs(right_cheek.x - left_cheek.x)
-            face_height = abs(chin.y - forehead.y)
-
-            if self.face_width > 0 and face_height > 0:
-                self.nose_offset_x = (nose.x - face_center_x) / self.face_width
-                self.nose_offset_y = (nose.y - face_center_y) / face_height
-            else:
-                self.nose_offset_x = 0
-                self.nose_offset_y = 0
-
-            self.face_looking_at_screen = (
-                abs(self.nose_offset_x) < Config.NOSE_OFFSET_THRESHOLD and
-                abs(self.nose_offset_y) < Config.NOSE_OFFSET_THRESHOLD
-            )
-
-            # === EYE/IRIS TRACKING ===
-            self._calculate_eye_gaze(landmarks)
-
-            # Draw landmarks for visualization
-            self._draw_landmarks(frame, landmarks, img_w, img_h)
+        self.analyze(frame, now)
+        return self.redraw(frame)
+
+    def analyze(self, frame, now: Optional[float] = None):
+        """Run face mesh on a frame and update attention state without drawing."""
+        # While a tracked face sits still, keep the previous detection
+        if self._scene_changed(frame):
+            results = self.face_mesh.process(self._inference_input(frame))
+            self.landmarks = None
+
+            self.face_detected = False
+            self.face_looking_at_screen = False
+            self.eyes_looking_at_screen = False
+
+            if results.multi_face_landmarks:
+                self.face_detected = True
+                landmarks = results.multi_face_landmarks[0].landmark
+                self._lm_buf[:] = [(landmarks[i].x, landmarks[i].y) for i in self._lm_idx]
+                if not Config.IRIS_REFINE:
+                    # Approximate each iris by the mean of its eye's four bounds
+                    regions = self._lm_buf.reshape(3, 5, 2)
+                    regions[1:, 0] = regions[1:, 1:].mean(axis=1)
+                self.landmarks = self._lm_buf
+
+                # === FACE AND EYE/IRIS TRACKING ===
+                (nose_x, nose_y, self.face_width, self.face_looking_at_screen,
+                 left_x, left_y, right_x, right_y, avg_x, avg_y,
+                 self.eyes_looking_at_screen) = _compute_state(
+                    self._lm_buf, Config.NOSE_OFFSET_THRESHOLD, Config.EYE_GAZE_THRESHOLD
+                )
+                self.nose_offset[:] = nose_x, nose_y
+                self.eye_gaze[:] = left_x, left_y, right_x, right_y
+                self.avg_gaze[:] = avg_x, avg_y
 
         # Attention = face looking at screen AND eyes looking at screen
         new_attentive = self.face_detected and self.face_looking_at_screen and self.eyes_looking_at_screen
-        self._update_attention_state(new_attentive)
-
-        return frame
+        self._update_attention_state(new_attentive, time.perf_counter() if now is None else now)
+
+    def _scene_changed(self, frame):
+        """Motion gate: compare a 32x32 grayscale thumbnail with the last analyzed frame."""
+        thumb = cv2.cvtColor(cv2.resize(frame, (32, 32), interpolation=cv2.INTER_AREA), cv2.COLOR_BGR2GRAY)
+
+        # Only reuse a detection that found a face, and re-run face mesh at
+        # least every MOTION_MAX_SKIP frames so slow drift is still picked up
+        if (self.face_detected and self._prev_thumb is not None
+                and self._skipped_frames < Config.MOTION_MAX_SKIP
+                and cv2.absdiff(thumb, self._prev_thumb).mean() < Config.MOTION_THRESHOLD):
+            self._skipped_frames += 1
+            return False
+
+        self._prev_thumb = thumb
+        self._skipped_frames = 0
+        return True
+
+    def _inference_input(self, frame):
+        """Downscaled RGB copy of a BGR frame for MediaPipe."""
+        img_h, img_w = frame.shape[:2]
 
-    def _calculate_eye_gaze(self, landmarks):
-        """Calculate eye gaze direction from iris position within eye bounds."""
-        # Left eye
-        left_iris = landmarks[self.LEFT_IRIS_CENTER]
-        left_eye_left = landmarks[self.LEFT_EYE_LEFT]
-        left_eye_right = landmarks[self.LEFT_EYE_RIGHT]
-        left_eye_top = landmarks[self.LEFT_EYE_TOP]
-        left_eye_bottom = landmarks[self.LEFT_EYE_BOTTOM]
-
-        # Calculate left eye center
-        left_eye_center_x = (left_eye_left.x + left_eye_right.x) / 2
-        left_eye_center_y = (left_eye_top.y + left_eye_bottom.y) / 2
-        left_eye_width = abs(left_eye_right.x - left_eye_left.x)
-        left_eye_height = abs(left_eye_bottom.y - left_eye_top.y)
-
-        # Iris offset from eye center (normalized)
-        if left_eye_width > 0 and left_eye_height > 0:
-            self.left_eye_gaze_x = (left_iris.x - left_eye_center_x) / left_eye_width
-            self.left_eye_gaze_y = (left_iris.y - left_eye_center_y) / left_eye_height
+        # MediaPipe downsamples internally anyway, so shrink before converting to RGB.
+        # Landmarks are normalized, so nothing needs rescaling afterwards.
+        size = None
+        if img_w > Config.INFERENCE_WIDTH:
+            size = (Config.INFERENCE_WIDTH, round(img_h * Config.INFERENCE_WIDTH / img_w))
+
+        if self._use_opencl:
+            # Through the T-API both steps run on the OpenCL device; only the
+            # small RGB result is downloaded, since MediaPipe needs a NumPy array
+            small = cv2.UMat(frame)
+            if size is not None:
+                small = cv2.resize(small, size, interpolation=cv2.INTER_AREA)
+            return cv2.cvtColor(small, cv2.COLOR_BGR2RGB).get()
+
+        if size is not None:
+            if self._small_buf is None or self._small_buf.shape[1::-1] != size:
+                self._small_buf = np.empty((size[1], size[0], 3), np.uint8)
+            small = cv2.resize(frame, size, dst=self._small_buf, interpolation=cv2.INTER_AREA)
         else:
-            self.left_eye_gaze_x = 0
-            self.left_eye_gaze_y = 0
-
-        # Right eye
-        right_iris = landmarks[self.RIGHT_IRIS_CENTER]
-        right_eye_left = landmarks[self.RIGHT_EYE_LEFT]
-        right_eye_right = landmarks[self.RIGHT_EYE_RIGHT]
-        right_eye_top = landmarks[self.RIGHT_EYE_TOP]
-        right_eye_bottom = landmarks[self.RIGHT_EYE_BOTTOM]
-
-        # Calculate right eye center
-        right_eye_center_x = (right_eye_left.x + right_eye_right.x) / 2
-        right_eye_center_y = (right_eye_top.y + right_eye_bottom.y) / 2
-        right_eye_width = abs(right_eye_right.x - right_eye_left.x)
-        right_eye_height = abs(right_eye_bottom.y - right_eye_top.y)
-
-        # Iris offset from eye center (normalized)
-        if right_eye_width > 0 and right_eye_height > 0:
-            self.right_eye_gaze_x = (right_iris.x - right_eye_center_x) / right_eye_width
-            self.right_eye_gaze_y = (right_iris.y - right_eye_center_y) / right_eye_height
-        else:
-            self.right_eye_gaze_x = 0
-            self.right_eye_gaze_y = 0
-
-        # Average gaze from both eyes
-        avg_gaze_x = (abs(self.left_eye_gaze_x) + abs(self.right_eye_gaze_x)) / 2
-        avg_gaze_y = (abs(self.left_eye_gaze_y) + abs(self.right_eye_gaze_y)) / 2
-
-        # Eyes looking at screen if iris is near center of eye
-        self.eyes_looking_at_screen = (
-            avg_gaze_x < Config.EYE_GAZE_THRESHOLD and
-            avg_gaze_y < Config.EYE_GAZE_THRESHOLD
-        )
+            small = frame
+        if self._rgb_buf is None or self._rgb_buf.shape != small.shape:
+            self._rgb_buf = np.empty_like(small)
+        return cv2.cvtColor(small, cv2.COLOR_BGR2RGB, dst=self._rgb_buf)
+
+    def redraw(self, frame):
+        """Draw the last detected landmarks on a frame."""
+        if self.landmarks is not None:
+            img_h, img_w = frame.shape[:2]
+            self._draw_landmarks(frame, self.landmarks, img_w, img_h)
+        return frame
 
-    def _update_attention_state(self, new_state: bool):
+    def snapshot(self):
+        """Shallow copy of the current state, safe to read from another thread."""
+        state = copy.copy(self)
+        # The arrays are overwritten in place by the next frame
+        state.nose_offset = self.nose_offset.copy()
+        state.eye_gaze = self.eye_gaze.copy()
+        state.avg_gaze = self.avg_gaze.copy()
+        if self.landmarks is not None:
+            state.landmarks = self.landmarks.copy()
+        return state
+
+    def _update_attention_state(self, new_state: bool, current_time: float):
         """Update attention state with hysteresis."""
-        current_time = time.time()
 
         if new_state != self.is_attentive:
             if self.pending_state != new_state:
@@ -252,57 +335,29 @@ class AttentionDetector:
         else:
             self.pending_state = None
 
-    def _draw_landmarks(self, frame, landmarks, img_w, img_h):
+    def _draw_landmarks(self, frame, pts, img_w, img_h):
         """Draw key points on the frame."""
-        # Draw nose tip (blue)
-        nose = landmarks[self.NOSE_TIP]
-        nose_pt = (int(nose.x * img_w), int(nose.y * img_h))
+        pts = pts.reshape(3, 5, 2)
+        scale = (img_w, img_h)
+        points = (pts[:, 0] * scale).astype(int).tolist()
+        centers = ((pts[:, [1, 3], [0, 1]] + pts[:, [2, 4], [0, 1]]) / 2 * scale).astype(int).tolist()
+        nose_pt, left_iris_pt, right_iris_pt = map(tuple, points)
+        face_center, left_eye_center, right_eye_center = map(tuple, centers)
+
+        # Draw nose tip (blue) and face center reference (green)
         cv2.circle(frame, nose_pt, 5, (255, 0, 0), -1)
-
-        # Draw face center reference (green)
-        left_cheek = landmarks[self.LEFT_CHEEK]
-        right_cheek = landmarks[self.RIGHT_CHEEK]
-        forehead = landmarks[self.FOREHEAD]
-        chin = landmarks[self.CHIN]
-
-        center_x = int((left_cheek.x + right_cheek.x) / 2 * img_w)
-        center_y = int((forehead.y + chin.y) / 2 * img_h)
-        cv2.circle(frame, (center_x, center_y), 5, (0, 255, 0), -1)
+        cv2.circle(frame, face_center, 5, (0, 255, 0), -1)
 
         # Draw line from center to nose (shows face direction)
         face_color = (0, 255, 0) if self.face_looking_at_screen else (0, 0, 255)
-        cv2.line(frame, (center_x, center_y), nose_pt, face_color, 2)
+        cv2.line(frame, face_center, nose_pt, face_color, 2)
 
         # Draw eye tracking visualization
         eye_color = (0, 255, 0) if self.eyes_looking_at_screen else (0, 165, 255)  # Green or orange
 
-        # Left eye - draw iris and eye center
-        left_iris = landmarks[self.LEFT_IRIS_CENTER]
-        left_iris_pt = (int(left_iris.x * img_w), int(left_iris.y * img_h))
-
-        left_eye_left = landmarks[self.LEFT_EYE_LEFT]
-        left_eye_right = landmarks[self.LEFT_EYE_RIGHT]
-        left_eye_center_x = int((left_eye_left.x + left_eye_right.x) / 2 * img_w)
-        left_eye_top = landmarks[self.LEFT_EYE_TOP]
-        left_eye_bottom = landmarks[self.LEFT_EYE_BOTTOM]
-        left_eye_center_y = int((left_eye_top.y + left_eye_bottom.y) / 2 * img_h)
-
-        cv2.circle(frame, (left_eye_center_x, left_eye_center_y), 2, (255, 255, 255), -1)  # Eye center (white)
-        cv2.circle(frame, left_iris_pt, 4, eye_color, -1)  # Iris (green/orange)
-
-        # Right eye - draw iris and eye center
-        right_iris = landmarks[self.RIGHT_IRIS_CENTER]
-        right_iris_pt = (int(right_iris.x * img_w), int(right_iris.y * img_h))
-
-        right_eye_left = landmarks[self.RIGHT_EYE_LEFT]
-        right_eye_right = landmarks[self.RIGHT_EYE_RIGHT]
-        right_eye_center_x = int((right_eye_left.x + right_eye_right.x) / 2 * img_w)
-        right_eye_top = landmarks[self.RIGHT_EYE_TOP]
-        right_eye_bottom = landmarks[self.RIGHT_EYE_BOTTOM]
-        right_eye_center_y = int((right_eye_top.y + right_eye_bottom.y) / 2 * img_h)
-
-        cv2.circle(frame, (right_eye_center_x, right_eye_center_y), 2, (255, 255, 255), -1)  # Eye center (white)
-        cv2.circle(frame, right_iris_pt, 4, eye_color, -1)  # Iris (green/orange)
+        for eye_center, iris_pt in ((left_eye_center, left_iris_pt), (right_eye_center, right_iris_pt)):
+            cv2.circle(frame, eye_center, 2, (255, 255, 255), -1)  # Eye center (white)
+            cv2.circle(frame, iris_pt, 4, eye_color, -1)  # Iris (green/orange)
 
 
 class DataLogger:
@@ -310,47 +365,66 @@ class DataLogger:
 
     def __init__(self, log_dir: str = "."):
         self.log_dir = Path(log_dir)
-        self.session_id = datetime.now().strftime("%Y%m%d_%H%M%S")
+        # Row timestamps are the wall-clock start plus a perf_counter offset
+        self._start_wall = datetime.now()
+        self._start_mono = time.perf_counter()
+        self.session_id = self._start_wall.strftime("%Y%m%d_%H%M%S")
         self.log_file = self.log_dir / f"attention_log_{self.session_id}.csv"
         self.summary_file = self.log_dir / "attention_summary.csv"
         self.last_log_time = 0.0
 
-        with open(self.log_file, 'w', newline='') as f:
-            writer = csv.writer(f)
-            writer.writerow([
-                'timestamp', 'is_attentive', 'face_detected',
-                'face_looking', 'eyes_looking',
-                'nose_offset_x', 'nose_offset_y',
-                'eye_gaze_x', 'eye_gaze_y',
-                'session_time', 'attention_time', 'attention_pct'
-            ])
-
-    def log(self, detector: AttentionDetector, timer: AttentionTimer):
-        current_time = time.time()
+        # Keep the log open and buffer rows so each entry isn't an open/write/close
+        self._fh = open(self.log_file, 'w', newline='', buffering=1 << 16)
+        self._writer = csv.writer(self._fh)
+        self._pending = []
+        atexit.register(self.close)
+
+        self._writer.writerow([
+            'timestamp', 'is_attentive', 'face_detected',
+            'face_looking', 'eyes_looking',
+            'nose_offset_x', 'nose_offset_y',
+            'eye_gaze_x', 'eye_gaze_y',
+            'session_time', 'attention_time', 'attention_pct'
+        ])
+
+    def log(self, detector: AttentionDetector, timer: AttentionTimer, now: Optional[float] = None):
+        current_time = time.perf_counter() if now is None else now
         if current_time - self.last_log_time < Config.LOG_INTERVAL:
             return
 
         self.last_log_time = current_time
 
-        avg_eye_x = (abs(detector.left_eye_gaze_x) + abs(detector.right_eye_gaze_x)) / 2
-        avg_eye_y = (abs(detector.left_eye_gaze_y) + abs(detector.right_eye_gaze_y)) / 2
+        timestamp = self._start_wall + timedelta(seconds=current_time - self._start_mono)
+        self._pending.append([
+            timestamp.isoformat(timespec='milliseconds'),
+            int(detector.is_attentive),
+            int(detector.face_detected),
+            int(detector.face_looking_at_screen),
+            int(detector.eyes_looking_at_screen),
+            f"{detector.nose_offset[0]:.3f}",
+            f"{detector.nose_offset[1]:.3f}",
+            f"{detector.avg_gaze[0]:.3f}",
+            f"{detector.avg_gaze[1]:.3f}",
+            f"{timer.get_session_time(current_time):.1f}",
+            f"{timer.total_attention_time:.1f}",
+            f"{timer.get_attention_percentage(current_time):.1f}"
+        ])
+        if len(self._pending) >= Config.LOG_FLUSH_ROWS:
+            self.flush()
+
+    def flush(self):
+        """Write buffered rows to the log file."""
+        if self._fh.closed:
+            return
+        self._writer.writerows(self._pending)
+        self._pending.clear()
+        self._fh.flush()
 
-        with open(self.log_file, 'a', newline='') as f:
-            writer = csv.writer(f)
-            writer.writerow([
-                datetime.now().isoformat(),
-                int(detector.is_attentive),
-                int(detector.face_detected),
-                int(detector.face_looking_at_screen),
-                int(detector.eyes_looking_at_screen),
-                f"{detector.nose_offset_x:.3f}",
-                f"{detector.nose_offset_y:.3f}",
-                f"{avg_eye_x:.3f}",
-                f"{avg_eye_y:.3f}",
-                f"{timer.get_session_time():.1f}",
-                f"{timer.total_attention_time:.1f}",
-                f"{timer.get_attention_percentage():.1f}"
-            ])
+    def close(self):
+        """Flush remaining rows and close the log file."""
+        if not self._fh.closed:
+            self.flush()
+            self._fh.close()
 
     def save_summary(self, timer: AttentionTimer):
         write_header = not self.summary_file.exists()
@@ -364,7 +438,7 @@ class DataLogger:
                 ])
             writer.writerow([
                 self.session_id,
-                datetime.fromtimestamp(timer.session_start).isoformat(),
+                datetime.fromtimestamp(timer.session_start_wall).isoformat(),
                 datetime.now().isoformat(),
                 f"{timer.get_session_time():.1f}",
                 f"{timer.total_attention_time:.1f}",
@@ -375,26 +449,81 @@ class DataLogger:
 class AttentionMonitorUI:
     """Handles the visual display."""
 
+    # Labels drawn in a fixed color are rendered once and blitted each frame
+    SESSION_LABEL = "Session: "
+    ATTENTION_LABEL = "Attention: "
+    CONTROLS_TEXT = "Q:Quit R:Reset P:Pause F/E:Select +/-:Adjust"
+    TEXT_TOP = 35
+    LINE_HEIGHT = 22
+
     def __init__(self):
         self.window_name = "Attention Monitor"
         self.alert_flash_state = False
         self.last_flash_time = 0.0
+        self._static_size = None
+        self._static_patches = []
+        self._alert_size = None
+        self._alert_banner = None
+        self._session_x = 20 + self._label_width(self.SESSION_LABEL, 0.5, 1)
+        self._attention_x = 20 + self._label_width(self.ATTENTION_LABEL, 0.5, 1)
+
+    @staticmethod
+    def _label_width(label, scale, thickness):
+        """Offset at which text following the label starts."""
+        return cv2.getTextSize(label, cv2.FONT_HERSHEY_SIMPLEX, scale, thickness)[0][0] - thickness
+
+    @staticmethod
+    def _render_text(text, org, scale, color, thickness):
+        """Render text on black into a small patch, plus its coverage for blending."""
+        (text_w, text_h), baseline = cv2.getTextSize(text, cv2.FONT_HERSHEY_SIMPLEX, scale, thickness)
+        x0, y0 = org[0] - thickness, org[1] - text_h - thickness
+        patch = np.zeros((text_h + baseline + 2 * thickness, text_w + 2 * thickness, 3), np.uint8)
+        cv2.putText(patch, text, (org[0] - x0, org[1] - y0),
+                    cv2.FONT_HERSHEY_SIMPLEX, scale, color, thickness)
+        coverage = patch.max(axis=2, keepdims=True).astype(np.float32) / max(color)
+        return x0, y0, patch.astype(np.float32), 1.0 - coverage
+
+    def _draw_static_text(self, frame, img_w, img_h):
+        if self._static_size != (img_w, img_h):
+            self._static_size = (img_w, img_h)
+            self._static_patches = [
+                self._render_text(self.SESSION_LABEL.strip(), (20, self.TEXT_TOP + self.LINE_HEIGHT),
+                                  0.5, (255, 255, 255), 1),
+                self._render_text(self.ATTENTION_LABEL.strip(), (20, self.TEXT_TOP + 2 * self.LINE_HEIGHT),
+                                  0.5, (255, 255, 255), 1),
+                self._render_text(self.CONTROLS_TEXT, (10, img_h - 10), 0.35, (200, 200, 200), 1),
+            ]
+        for text_patch in self._static_patches:
+            self._blend_text(frame, *text_patch)
+
+    @staticmethod
+    def _blend_text(frame, x0, y0, patch, keep):
+        # Clip to the frame like putText does, for cameras smaller than the layout
+        h, w = patch.shape[:2]
+        img_h, img_w = frame.shape[:2]
+        top, left = max(0, -y0), max(0, -x0)
+        bottom, right = min(h, img_h - y0), min(w, img_w - x0)
+        if top >= bottom or left >= right:
+            return
+        roi = frame[y0 + top:y0 + bottom, x0 + left:x0 + right]
+        roi[:] = np.rint(roi * keep[top:bottom, left:right] + patch[top:bottom, left:right])
 
-    def draw_ui(self, frame, detector: AttentionDetector, timer: AttentionTimer):
+    def draw_ui(self, frame, detector: AttentionDetector, timer: AttentionTimer, now: Optional[float] = None):
+        now = time.perf_counter() if now is None else now
         img_h, img_w = frame.shape[:2]
 
         # Border color based on attention
         border_color = (0, 200, 0) if detector.is_attentive else (0, 0, 200)
         cv2.rectangle(frame, (0, 0), (img_w-1, img_h-1), border_color, 4)
 
-        # Stats overlay
-        overlay = frame.copy()
+        # Stats overlay: a 60% black panel, applied by dimming the region in place
         overlay_height = 280 if Config.DEBUG_MODE else 200
-        cv2.rectangle(overlay, (10, 10), (320, overlay_height), (0, 0, 0), -1)
-        cv2.addWeighted(overlay, 0.6, frame, 0.4, 0, frame)
+        panel = frame[10:overlay_height + 1, 10:321]
+        cv2.convertScaleAbs(panel, dst=panel, alpha=0.4)
+        self._draw_static_text(frame, img_w, img_h)
 
-        y_pos = 35
-        line_height = 22
+        y_pos = self.TEXT_TOP
+        line_height = self.LINE_HEIGHT
 
         # Status
         status_text = "ATTENTIVE" if detector.is_attentive else "DISTRACTED"
@@ -404,16 +533,18 @@ class AttentionMonitorUI:
         y_pos += line_height
 
         # Times
-        cv2.putText(frame, f"Session: {timer.format_time(timer.get_session_time())}",
-                    (20, y_pos), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
+        cv2.putText(frame, timer.format_time(timer.get_session_time(now)),
+                    (self._session_x, y_pos),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
         y_pos += line_height
 
-        cv2.putText(frame, f"Attention: {timer.format_time(timer.total_attention_time)}",
-                    (20, y_pos), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
+        cv2.putText(frame, timer.format_time(timer.total_attention_time),
+                    (self._attention_x, y_pos),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
         y_pos += line_height
 
         # Percentage
-        pct = timer.get_attention_percentage()
+        pct = timer.get_attention_percentage(now)
         pct_color = (0, 255, 0) if pct >= 70 else (0, 255, 255) if pct >= 50 else (0, 0, 255)
         cv2.putText(frame, f"Rate: {pct:.1f}%",
                     (20, y_pos), cv2.FONT_HERSHEY_SIMPLEX, 0.5, pct_color, 1)
@@ -436,43 +567,130 @@ class AttentionMonitorUI:
         # Debug info
         if Config.DEBUG_MODE:
             y_pos += 5
-            cv2.putText(frame, f"Face: X={detector.nose_offset_x:.2f} Y={detector.nose_offset_y:.2f} (thr:{Config.NOSE_OFFSET_THRESHOLD:.2f})",
+            cv2.putText(frame, f"Face: X={detector.nose_offset[0]:.2f} Y={detector.nose_offset[1]:.2f} (thr:{Config.NOSE_OFFSET_THRESHOLD:.2f})",
                         (20, y_pos), cv2.FONT_HERSHEY_SIMPLEX, 0.35, (200, 200, 0), 1)
             y_pos += 16
-            avg_eye_x = (abs(detector.left_eye_gaze_x) + abs(detector.right_eye_gaze_x)) / 2
-            avg_eye_y = (abs(detector.left_eye_gaze_y) + abs(detector.right_eye_gaze_y)) / 2
-            cv2.putText(frame, f"Eyes: X={avg_eye_x:.2f} Y={avg_eye_y:.2f} (thr:{Config.EYE_GAZE_THRESHOLD:.2f})",
+            cv2.putText(frame, f"Eyes: X={detector.avg_gaze[0]:.2f} Y={detector.avg_gaze[1]:.2f} (thr:{Config.EYE_GAZE_THRESHOLD:.2f})",
                         (20, y_pos), cv2.FONT_HERSHEY_SIMPLEX, 0.35, (200, 200, 0), 1)
 
         # Alert if distracted too long
         if timer.current_distraction_duration >= Config.DISTRACTION_ALERT_DELAY:
-            self._draw_alert(frame, img_w, img_h)
-
-        # Controls
-        cv2.putText(frame, "Q:Quit R:Reset P:Pause F/E:Select +/-:Adjust",
-                    (10, img_h - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.35, (200, 200, 200), 1)
+            self._draw_alert(frame, img_w, img_h, now)
 
         return frame
 
-    def _draw_alert(self, frame, img_w, img_h):
-        current_time = time.time()
+    def _draw_alert(self, frame, img_w, img_h, current_time):
         if current_time - self.last_flash_time >= 0.5:
             self.alert_flash_state = not self.alert_flash_state
             self.last_flash_time = current_time
 
         if self.alert_flash_state:
-            banner_height = 60
-            overlay = frame.copy()
-            cv2.rectangle(overlay, (0, img_h // 2 - banner_height // 2),
-                         (img_w, img_h // 2 + banner_height // 2), (0, 0, 200), -1)
-            cv2.addWeighted(overlay, 0.7, frame, 0.3, 0, frame)
+            # The banner only depends on the frame size, so its fill and text are
+            # rendered once and blended into the banner rows in place
+            if self._alert_size != (img_w, img_h):
+                banner_height = 60
+                y0 = max(0, img_h // 2 - banner_height // 2)
+                y1 = min(img_h, img_h // 2 + banner_height // 2 + 1)
+                fill = np.full((y1 - y0, img_w, 3), (0, 0, 200), np.uint8)
+
+                text = "ATTENTION NEEDED!"
+                text_size = cv2.getTextSize(text, cv2.FONT_HERSHEY_SIMPLEX, 1.2, 3)[0]
+                text_x = (img_w - text_size[0]) // 2
+                text_y = img_h // 2 + text_size[1] // 2
+                text_patch = self._render_text(text, (text_x, text_y), 1.2, (255, 255, 255), 3)
+
+                self._alert_size = (img_w, img_h)
+                self._alert_banner = (y0, y1, fill, text_patch)
+
+            y0, y1, fill, text_patch = self._alert_banner
+            banner = frame[y0:y1]
+            cv2.addWeighted(fill, 0.7, banner, 0.3, 0, banner)
+            self._blend_text(frame, *text_patch)
+
+
+def _put_latest(q: queue.Queue, item):
+    """Put item on a bounded queue, dropping the oldest entry when it is full."""
+    while True:
+        try:
+            q.put_nowait(item)
+            return
+        except queue.Full:
+            try:
+                q.get_nowait()
+            except queue.Empty:
+                pass
+
+
+class CameraGrabber(threading.Thread):
+    """Pipeline stage 1: reads the camera on its own thread, keeping only the newest frame."""
+
+    def __init__(self, cap, stop: threading.Event):
+        super().__init__(daemon=True)
+        self.cap = cap
+        self.stop = stop
+        self.latest = None
+        self.seq = 0
+        self._cond = threading.Condition()
+
+        # Don't let the driver queue up frames that would only be dropped
+        cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+
+    def run(self):
+        while not self.stop.is_set():
+            ret = self.cap.grab()
+            if ret:
+                ret, frame = self.cap.retrieve()
+            if not ret:
+                print("Error: Could not read frame!")
+                self.stop.set()
+                break
+
+            frame = cv2.flip(frame, 1)
+            with self._cond:
+                self.latest = frame
+                self.seq += 1
+                self._cond.notify_all()
+
+        with self._cond:
+            self._cond.notify_all()
+
+    def wait_for_frame(self, after_seq: int, timeout: float = 0.1):
+        """Return (frame, seq) for the newest frame after after_seq, or (None, after_seq) on timeout.
+
+        The frame is shared between callers and must not be modified.
+        """
+        with self._cond:
+            self._cond.wait_for(lambda: self.seq > after_seq or self.stop.is_set(), timeout)
+            if self.seq > after_seq:
+                return self.latest, self.seq
+            return None, after_seq
+
+
+def inference_loop(detector: AttentionDetector, grabber: CameraGrabber, states: queue.Queue,
+                   stop: threading.Event, paused: threading.Event):
+    """Pipeline stage 2: run face mesh on the newest frame."""
+    # Inference takes whichever frame is newest once it is free, so frames that
+    # arrive while it is busy are skipped and the UI draws them with the previous
+    # landmarks. It is also capped at TARGET_FPS, with a quarter frame of slack.
+    min_interval = 0.75 / Config.TARGET_FPS
+    last_processed = 0.0
+    seq = 0
+    try:
+        while not stop.is_set():
+            frame, seq = grabber.wait_for_frame(seq)
+            if frame is None or paused.is_set():
+                continue
+            now = time.perf_counter()
+            if now - last_processed < min_interval:
+                continue
+            last_processed = now
 
-            text = "ATTENTION NEEDED!"
-            text_size = cv2.getTextSize(text, cv2.FONT_HERSHEY_SIMPLEX, 1.2, 3)[0]
-            text_x = (img_w - text_size[0]) // 2
-            text_y = img_h // 2 + text_size[1] // 2
-            cv2.putText(frame, text, (text_x, text_y),
-                       cv2.FONT_HERSHEY_SIMPLEX, 1.2, (255, 255, 255), 3)
+            # Frames from the grabber are shared with the UI and never drawn on
+            detector.analyze(frame, now)
+            _put_latest(states, detector.snapshot())
+    finally:
+        # If inference fails, end the session instead of timing a stale state
+        stop.set()
 
 
 def main():
@@ -488,6 +706,9 @@ def main():
     print("  -      - Decrease threshold (stricter)")
     print("=" * 40)
 
+    # OpenCV's thread pool is process-wide, so it is sized once for inference
+    cv2.setNumThreads(WORKER_THREADS)
+
     detector = AttentionDetector()
     timer = AttentionTimer()
     logger = DataLogger()
@@ -501,7 +722,7 @@ def main():
     cap.set(cv2.CAP_PROP_FRAME_WIDTH, 640)
     cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 480)
 
-    paused = False
+    paused = threading.Event()
     adjust_mode = "face"  # "face" or "eye"
 
     print("\nStarting attention monitoring...")
@@ -509,8 +730,23 @@ def main():
     print(f"Eye threshold: {Config.EYE_GAZE_THRESHOLD}")
     print("Press F to adjust face, E to adjust eyes, then +/- to change\n")
 
+    # Capture and inference run on worker threads; timing, logging and the
+    # window stay here since OpenCV's HighGUI must run on the main thread
+    states = queue.Queue(maxsize=2)
+    stop = threading.Event()
+    grabber = CameraGrabber(cap, stop)
+    workers = [
+        grabber,
+        threading.Thread(target=inference_loop, args=(detector, grabber, states, stop, paused), daemon=True),
+    ]
+    for worker in workers:
+        worker.start()
+    state = None
+    seq = 0
+    last_show = 0.0
+
     try:
-        while True:
+        while not stop.is_set():
             key = cv2.waitKey(1) & 0xFF
 
             if key == ord('q') or key == 27:
@@ -519,8 +755,12 @@ def main():
                 timer.reset()
                 print("Counters reset!")
             elif key == ord('p'):
-                paused = not paused
-                print("Paused" if paused else "Resumed")
+                if paused.is_set():
+                    paused.clear()
+                    print("Resumed")
+                else:
+                    paused.set()
+                    print("Paused")
             elif key == ord('f'):
                 adjust_mode = "face"
                 print(f"Now adjusting: FACE threshold ({Config.NOSE_OFFSET_THRESHOLD:.2f})")
@@ -542,27 +782,45 @@ def main():
                     Config.EYE_GAZE_THRESHOLD = max(0.1, Config.EYE_GAZE_THRESHOLD - 0.02)
                     print(f"Eye threshold: {Config.EYE_GAZE_THRESHOLD:.2f} (stricter)")
 
-            if paused:
+            if paused.is_set():
                 continue
 
-            ret, frame = cap.read()
-            if not ret:
-                print("Error: Could not read frame!")
-                break
+            frame, seq = grabber.wait_for_frame(seq, timeout=0.01)
+            if frame is None:
+                continue
+            while not states.empty():
+                state = states.get_nowait()
+            # One timestamp per frame for the timer, logger, throttle and overlay
+            now = time.perf_counter()
+            if state is None:
+                # Nothing to time or log until the first frame has been analyzed
+                cv2.imshow(ui.window_name, frame)
+                continue
 
-            frame = cv2.flip(frame, 1)
-            frame = detector.process_frame(frame)
-            timer.update(detector.is_attentive)
-            logger.log(detector, timer)
-            frame = ui.draw_ui(frame, detector, timer)
+            timer.update(state.is_attentive, now)
+            logger.log(state, timer, now)
+
+            # Cap redraws at DISPLAY_FPS, allowing a quarter interval of jitter;
+            # waitKey above still runs every iteration to keep the window responsive
+            if now - last_show < 0.75 / Config.DISPLAY_FPS:
+                continue
+            last_show = now
+
+            # The grabber's frame is shared with inference, so draw on a copy
+            frame = state.redraw(frame.copy())
+            frame = ui.draw_ui(frame, state, timer, now)
             cv2.imshow(ui.window_name, frame)
 
     except KeyboardInterrupt:
         print("\nInterrupted by user")
 
     finally:
+        stop.set()
+        for worker in workers:
+            worker.join()
         cap.release()
         cv2.destroyAllWindows()
+        logger.close()
         logger.save_summary(timer)
 
         print("\n" + "=" * 40)